@@ -0,0 +1,121 @@
+import pandas as pd
+
+from compact_log import compact_log, location_view
+
+# Aggregations shared by the Streamlit tabs and export_service's
+# /analytics endpoints.
+
+PERIODS = ["Week", "Month", "Year"]
+LOCATION_FILTERS = ["All", "Home", "Public"]
+
+
+def prepare_analytics(df):
+
+    # compact logs already carry the period columns and are sorted by
+    # Location, which location_view relies on
+    if "Week" in df.columns:
+        return df
+
+    return compact_log(df)
+
+def aggregate_costs(df, period, include_location=True):
+
+    group_map = {
+        "Week": "Week",
+        "Month": "Month",
+        "Year": "Year"
+    }
+
+    col = group_map[period]
+
+    group_cols = [col]
+    if include_location:
+        group_cols.append("Location")
+
+    agg = (
+        df.groupby(group_cols, observed=True)
+          .agg(
+              Total_Cost=("Total Cost", "sum"),
+              Sessions=("Total Cost", "count"),
+              Total_kWh=("kWh", "sum")
+          )
+          .reset_index()
+    )
+
+    agg["Avg_Cost_per_Session"] = agg["Total_Cost"] / agg["Sessions"]
+    agg["Avg_Cost_per_kWh"] = agg["Total_Cost"] / agg["Total_kWh"].replace(0, pd.NA)
+
+    return agg.sort_values(col, ascending=False)
+
+
+def cost_summary(df):
+    total_kwh = df["kWh"].sum()
+
+    return {
+        "total_spent": float(df["Total Cost"].sum()),
+        "avg_session_cost": float(df["Total Cost"].mean()),
+        "avg_price_per_kwh": float(df["Total Cost"].sum() / total_kwh) if total_kwh > 0 else 0.0
+    }
+
+
+def cost_insights(df, period, location_filter):
+    df = location_view(prepare_analytics(df), location_filter)
+
+    agg = aggregate_costs(
+        df,
+        period,
+        include_location=(location_filter != "All")
+    )
+
+    return df, agg, cost_summary(df)
+
+
+# ---------- Performance ----------
+
+def performance_frame(df, location_filter):
+    df = location_view(prepare_analytics(df), location_filter)
+    df = df[df["Duration Hours"] > 0]
+    return df.assign(Speed_kW=df["kWh"] / df["Duration Hours"])
+
+
+def performance_summary(df):
+    total_kwh = df["kWh"].sum()
+    total_hours = df["Duration Hours"].sum()
+
+    return {
+        "total_kwh": float(total_kwh),
+        "avg_speed_kw": float(total_kwh / total_hours) if total_hours > 0 else 0.0,
+        "median_speed_kw": float(df["Speed_kW"].median())
+    }
+
+
+def aggregate_performance(df, period, include_location=True):
+    group_cols = [period]
+    if include_location:
+        group_cols.append("Location")
+
+    return (
+        df.groupby(group_cols, observed=True)
+          .agg(
+              Avg_Speed=("Speed_kW", "mean"),
+              Median_Speed=("Speed_kW", "median"),
+              Sessions=("Speed_kW", "count"),
+              Total_kWh=("kWh", "sum"),
+              Total_Hours=("Duration Hours", "sum")
+          )
+          .round(2)
+          .reset_index()
+          .sort_values(period, ascending=False)
+    )
+
+
+def performance_insights(df, period, location_filter):
+    df = performance_frame(df, location_filter)
+
+    agg = aggregate_performance(
+        df,
+        period,
+        include_location=(location_filter == "All")
+    )
+
+    return df, agg, performance_summary(df)
@@ -1,13 +1,16 @@
 import streamlit as st
 import pandas as pd
 from datetime import datetime, time
-from pathlib import Path
 import os
 from s3_utils import read_csv_s3, write_csv_s3
-import io
-from botocore.exceptions import ClientError
-import boto3
 from auth_utils import load_password
+from s3_links import get_cached_presigned_url
+from compact_log import compact_log, memory_report, to_log_frame
+from analytics import PERIODS, LOCATION_FILTERS, cost_insights, performance_insights
+from forecast import cached_forecast
+from log_quality import check_log, flagged_rows, schema_issues
+from versioned_store import restore_version, version_as_of
+from pricing import get_weighted_price, optimize_charge_window
 
 LOG_FILE = "charging_log.csv"
 HOUSE_PRICE_FILE = "house_prices.csv"
@@ -60,10 +63,9 @@ if st.sidebar.button("Logout", key="logout_btn"):
 
 
 
-def fetch_csv_from_s3(key):
-    s3 = boto3.client("s3")
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-    return obj["Body"].read()
+def export_url(key):
+    # downloads go straight to S3, the app never proxies the bytes
+    return get_cached_presigned_url(key)
 
 params = st.query_params
 
@@ -93,53 +95,6 @@ def load_config():
 
 
 
-def parse_time(t):
-    if pd.isna(t):
-        return time(0, 0)
-
-    if isinstance(t, (float, int)) and not pd.isna(t):
-        hours = int(t)
-        minutes = int((t - hours) * 60)
-        return time(hours, minutes)
-
-    if isinstance(t, str):
-        try:
-            return datetime.strptime(t, "%H:%M:%S").time()
-        except:
-            return datetime.strptime(t, "%H:%M").time()
-
-    return time(0, 0)
-
-
-
-def get_weighted_price(row, start_dt, end_dt):
-    start = parse_time(row["Start Time"])
-    end = parse_time(row["End Time"])
-
-    price_a = float(row["Price A"])
-    price_b = float(row["Price B"])
-    add_p = float(row["Additional Price"])
-
-    total_cost = 0
-    total_hours = 0
-    current = start_dt
-
-    while current < end_dt:
-        nxt = min(current + pd.Timedelta(minutes=1), end_dt)
-        cur_time = current.time()
-
-        if start <= end:
-            in_range = start <= cur_time <= end
-        else:
-            in_range = cur_time >= start or cur_time <= end
-
-        price = price_a if in_range else price_b
-        total_cost += price * ((nxt - current).total_seconds() / 3600)
-        total_hours += (nxt - current).total_seconds() / 3600
-        current = nxt
-
-    return round((total_cost / total_hours) + add_p, 4)
-
 def load_session():
     df = read_csv_s3(SESSION_FILE, [
         "Timestamp Start",
@@ -212,55 +167,17 @@ for col in ["Range Start", "Range End"]:
     if col not in log_df.columns:
         log_df[col] = None
 
+# typed, categorical log shared by every tab; the parsed CSV is dropped and
+# rebuilt with to_log_frame only where the log is edited or written
+log_compact = compact_log(log_df)
+st.session_state.log_memory = memory_report(log_df, log_compact)
+del log_df
 
 config = load_config()
 battery_capacity = float(config.iloc[0]["BatteryCapacity_kWh"])
 full_range = float(config.iloc[0]["FullRange"])
 
 
-def prepare_analytics(df):
-
-    df = df.copy()
-
-    df["Timestamp Start"] = pd.to_datetime(df["Timestamp Start"], errors="coerce")
-
-    df["Year"]  = df["Timestamp Start"].dt.year
-    df["Month"] = df["Timestamp Start"].dt.to_period("M").astype(str)
-    df["Week"]  = df["Timestamp Start"].dt.to_period("W").astype(str)
-
-    return df
-
-def aggregate_costs(df, period, include_location=True):
-
-    group_map = {
-        "Week": "Week",
-        "Month": "Month",
-        "Year": "Year"
-    }
-
-    col = group_map[period]
-
-    group_cols = [col]
-    if include_location:
-        group_cols.append("Location")
-
-    agg = (
-        df.groupby(group_cols)
-          .agg(
-              Total_Cost=("Total Cost", "sum"),
-              Sessions=("Total Cost", "count"),
-              Total_kWh=("kWh", "sum")
-          )
-          .reset_index()
-    )
-
-    agg["Avg_Cost_per_Session"] = agg["Total_Cost"] / agg["Sessions"]
-    agg["Avg_Cost_per_kWh"] = agg["Total_Cost"] / agg["Total_kWh"].replace(0, pd.NA)
-
-    return agg.sort_values(col, ascending=False)
-
-
-
 # ---------- UI ----------
 
 st.title("🔌 Charging Log")
@@ -276,70 +193,30 @@ with tab_perf:
 
     st.subheader("⚡ Charging Performance Insights")
 
-    df = read_csv_s3(LOG_FILE)
+    df = log_compact
 
     if len(df) == 0:
         st.info("No data yet.")
         st.stop()
 
-    # ---- Ensure types ----
-    df["Timestamp Start"] = pd.to_datetime(df["Timestamp Start"], errors="coerce")
-    df["kWh"] = pd.to_numeric(df["kWh"], errors="coerce")
-    df["Duration Hours"] = pd.to_numeric(df["Duration Hours"], errors="coerce")
-
-    df = df[df["Duration Hours"] > 0]
-
     # ---------- FILTERS ----------
-    df["Year"]  = df["Timestamp Start"].dt.year
-    df["Month"] = df["Timestamp Start"].dt.to_period("M").astype(str)
-    df["Week"]  = df["Timestamp Start"].dt.to_period("W").astype(str)
-
-    period = st.selectbox("Aggregation level", ["Week", "Month", "Year"], key="perf_period")
-    location_filter = st.selectbox("Location filter", ["All", "Home", "Public"], key="perf_loc")
-
-    if location_filter != "All":
-        df = df[df["Location"] == location_filter]
+    period = st.selectbox("Aggregation level", PERIODS, key="perf_period")
+    location_filter = st.selectbox("Location filter", LOCATION_FILTERS, key="perf_loc")
 
-    # ---------- SPEED CALC ----------
-    df["Speed_kW"] = df["kWh"] / df["Duration Hours"]
+    df, agg, kpis = performance_insights(df, period, location_filter)
 
     # ---------- GLOBAL KPIs ----------
     st.subheader("Summary KPIs")
 
-    total_kwh = df["kWh"].sum()
-    total_hours = df["Duration Hours"].sum()
-    avg_speed = total_kwh / total_hours if total_hours > 0 else 0
-    median_speed = df["Speed_kW"].median()
-
     c1, c2, c3 = st.columns(3)
 
-    c1.metric("Total energy charged", f"{total_kwh:,.1f} kWh")
-    c2.metric("Average charging speed", f"{avg_speed:,.2f} kW")
-    c3.metric("Median charging speed", f"{median_speed:,.2f} kW")
+    c1.metric("Total energy charged", f"{kpis['total_kwh']:,.1f} kWh")
+    c2.metric("Average charging speed", f"{kpis['avg_speed_kw']:,.2f} kW")
+    c3.metric("Median charging speed", f"{kpis['median_speed_kw']:,.2f} kW")
 
     st.divider()
 
     # ---------- AGGREGATION ----------
-    group_col = period
-
-    group_cols = [group_col]
-    if location_filter == "All":
-        group_cols.append("Location")
-
-    agg = (
-        df.groupby(group_cols)
-          .agg(
-              Avg_Speed=("Speed_kW", "mean"),
-              Median_Speed=("Speed_kW", "median"),
-              Sessions=("Speed_kW", "count"),
-              Total_kWh=("kWh", "sum"),
-              Total_Hours=("Duration Hours", "sum")
-          )
-          .round(2)
-          .reset_index()
-          .sort_values(group_col, ascending=False)
-    )
-
     st.subheader("Aggregated Performance")
 
     st.dataframe(agg, use_container_width=True)
@@ -357,42 +234,43 @@ with tab_insights:
 
     st.subheader("📈 Charging Insights")
 
-    df = read_csv_s3(LOG_FILE)
+    df = log_compact
 
     if len(df) == 0:
         st.info("No data yet.")
         st.stop()
 
-    df = prepare_analytics(df)
+    period = st.selectbox("Aggregation level", PERIODS)
+    location_filter = st.selectbox("Location filter", LOCATION_FILTERS)
 
-    period = st.selectbox("Aggregation level", ["Week", "Month", "Year"])
-    location_filter = st.selectbox("Location filter", ["All", "Home", "Public"])
+    df, agg, kpis = cost_insights(df, period, location_filter)
 
-    if location_filter != "All":
-        df = df[df["Location"] == location_filter]
+    st.dataframe(agg, use_container_width=True)
 
-    agg = aggregate_costs(
-                            df,
-                            period,
-                            include_location=(location_filter != "All")
-                        )
+    st.divider()
 
+    st.subheader("Summary KPIs")
 
-    st.dataframe(agg, use_container_width=True)
+    c1, c2, c3 = st.columns(3)
+
+    c1.metric("Total spent", f"£{kpis['total_spent']:,.2f}")
+    c2.metric("Avg session cost", f"£{kpis['avg_session_cost']:,.2f}")
+    c3.metric("Avg price per kWh", f"£{kpis['avg_price_per_kwh']:,.2f}")
 
     st.divider()
 
-    st.subheader("Summary KPIs")
+    st.subheader("🔮 Next period projection")
 
-    total_spent = df["Total Cost"].sum()
-    avg_session = df["Total Cost"].mean()
-    avg_kwh = (df["Total Cost"].sum() / df["kWh"].sum()) if df["kWh"].sum() > 0 else 0
+    forecast_period = "Week" if period == "Week" else "Month"
+    forecast_by = ["Location", "Company"] if location_filter == "Public" else ["Location"]
 
-    c1, c2, c3 = st.columns(3)
+    projection = cached_forecast(log_compact, forecast_period, forecast_by)
+
+    if location_filter != "All":
+        projection = projection[projection["Location"] == location_filter]
 
-    c1.metric("Total spent", f"£{total_spent:,.2f}")
-    c2.metric("Avg session cost", f"£{avg_session:,.2f}")
-    c3.metric("Avg price per kWh", f"£{avg_kwh:,.2f}")
+    st.dataframe(projection, use_container_width=True)
+    st.caption("Current period, projected from the completed ones before it and adjusted by the same period last year when there is enough history.")
 
 
 with tab_log:
@@ -635,18 +513,53 @@ with tab_log:
 
 
 
-            log_df = pd.concat([log_df, new_row], ignore_index=True)[LOG_COLUMNS]
+            log_df = pd.concat([to_log_frame(log_compact), new_row], ignore_index=True)[LOG_COLUMNS]
             write_csv_s3(log_df, LOG_FILE)
 
             clear_session()
             st.success("Charging finished!")
             st.rerun()
 
+    # ---------- Smart charging planner ----------
+
+    st.divider()
+
+    with st.expander("🧠 Smart charging planner"):
+        plan_bat = float(session["Battery Start %"]) if session is not None else float(bat_start)
+        st.caption(f"Battery now: {plan_bat:.0f}%")
+
+        plan_target = st.slider("Target battery (%)", 0, 100, 80, key="plan_target")
+        plan_kw = st.number_input("Charger power (kW)", value=7.0, step=0.1, key="plan_kw")
+
+        if location == "Home":
+            tariff = house_prices.iloc[0] if len(house_prices) > 0 else None
+        else:
+            match = public_prices[public_prices["Company"] == company]
+            tariff = match.iloc[0] if len(match) > 0 else None
+
+        plan = None
+        if tariff is not None:
+            plan = optimize_charge_window(tariff, plan_bat, plan_target, battery_capacity, plan_kw)
+
+        if tariff is None:
+            st.info("No price configured for this location yet.")
+        elif plan is None:
+            st.info("Nothing to charge for this target.")
+        else:
+            st.success(f"Cheapest start: {plan['start']:%d/%m %H:%M} → ready by {plan['end']:%H:%M}")
+
+            c1, c2, c3 = st.columns(3)
+            c1.metric("Energy", f"{plan['kWh']:,.2f} kWh")
+            c2.metric("Expected cost", f"£{plan['cost']:,.2f}")
+            c3.metric("If started now", f"£{plan['cost_if_now']:,.2f}")
+
 with tab_history:
 
     st.subheader("📊 Charging History (Editable)")
 
-    history_df = read_csv_s3(LOG_FILE)
+    # same log this run already loaded, no second download
+    log_view = to_log_frame(log_compact)
+    history_df = log_view.copy()
 
     if len(history_df) == 0:
         st.info("No charging sessions recorded yet.")
@@ -657,6 +570,16 @@ with tab_history:
 
     history_df = history_df.sort_values("Timestamp Start", ascending=False)
 
+    # ---------- Data quality ----------
+    schema = schema_issues(log_view, LOG_COLUMNS)
+    if schema:
+        st.error("Log schema problems: " + "; ".join(schema))
+
+    flagged = flagged_rows(log_view, check_log(log_view))
+    if len(flagged) > 0:
+        with st.expander(f"⚠️ {len(flagged)} sessions flagged by data-quality checks"):
+            st.dataframe(flagged, use_container_width=True)
+
     edited_df = st.data_editor(
         history_df,
         num_rows="dynamic",
@@ -665,6 +588,8 @@ with tab_history:
 
     st.caption("Edit any field directly in the table above and click Save to persist changes.")
 
+    st.link_button("⬇️ Download full log (CSV)", export_url(LOG_FILE))
+
     if st.button("💾 Save changes"):
         edited_df["Timestamp Start"] = edited_df["Timestamp Start"].dt.strftime("%Y-%m-%d %H:%M:%S")
         edited_df["Timestamp End"]   = edited_df["Timestamp End"].dt.strftime("%Y-%m-%d %H:%M:%S")
@@ -690,6 +615,54 @@ with tab_admin:
             }]), CONFIG_FILE)
 
 
+    with st.expander("🧠 Memory usage"):
+        mem = st.session_state.log_memory
+        st.caption(f"Charging log held by this session ({mem['rows']} rows)")
+
+        c1, c2, c3 = st.columns(3)
+        c1.metric("Parsed CSV (dropped)", f"{mem['raw_bytes'] / 1024:,.1f} KiB")
+        c2.metric("Held as compact log", f"{mem['compact_bytes'] / 1024:,.1f} KiB")
+        c3.metric("Saved", f"{mem['saved_pct']}%")
+
+
+    with st.expander("🕓 Version history"):
+        # nothing is fetched until asked for: expander bodies run on every rerun
+        with st.form("ver_form"):
+            table = st.selectbox(
+                "Table",
+                [LOG_FILE, HOUSE_PRICE_FILE, PUBLIC_PRICE_FILE, CONFIG_FILE],
+                key="ver_table"
+            )
+
+            c1, c2 = st.columns(2)
+            with c1:
+                as_of_date = st.date_input("As of date", key="ver_date")
+            with c2:
+                as_of_time = st.time_input("As of time", value=time(23, 59), key="ver_time")
+
+            if st.form_submit_button("🔍 Show version"):
+                as_of = datetime.combine(as_of_date, as_of_time)
+                version = version_as_of(table, as_of)
+                preview = read_csv_s3(table, as_of=as_of) if version is not None else None
+                st.session_state.ver_preview = (table, version, preview)
+
+        if "ver_preview" in st.session_state:
+            table, version, preview = st.session_state.ver_preview
+
+            if version is None:
+                st.info("No saved version of this table at that time.")
+            else:
+                saved_at = datetime.fromtimestamp(version["ts"])
+                st.caption(f"{table}, version saved {saved_at:%Y-%m-%d %H:%M:%S}")
+                st.dataframe(preview, use_container_width=True)
+
+                if st.button("↩️ Restore this version", key="ver_restore"):
+                    restore_version(table, version)
+                    del st.session_state.ver_preview
+                    st.success("Version restored.")
+                    st.rerun()
+
+
     with st.expander("⚙️ Set Prices"):
 
         st.subheader("🏠 Home Price")
@@ -1,4 +1,3 @@
-import pandas as pd
 from s3_utils import read_csv_s3
 
 AUTH_FILE = "auth_config.csv"
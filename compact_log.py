@@ -0,0 +1,108 @@
+import numpy as np
+import pandas as pd
+
+TIMESTAMP_COLUMNS = ["Timestamp Start", "Timestamp End"]
+CATEGORY_COLUMNS = ["Location", "Company"]
+
+# battery %, miles and hours don't need more than float32
+FLOAT32_COLUMNS = [
+    "Duration Hours",
+    "Battery Start %",
+    "Battery End %",
+    "Range Start",
+    "Range End",
+]
+
+# money and energy totals are summed, keep full precision
+FLOAT64_COLUMNS = ["kWh", "Price per kWh", "Total Cost"]
+
+# added by compact_log, never written back
+DERIVED_COLUMNS = ["Year", "Month", "Week"]
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+def compact_log(df):
+    cols = {}
+
+    for col in df.columns:
+        s = df[col]
+
+        if col in TIMESTAMP_COLUMNS:
+            # datetime64[s] is an int64 epoch in seconds
+            cols[col] = pd.to_datetime(s, errors="coerce").astype("datetime64[s]")
+        elif col in CATEGORY_COLUMNS:
+            cols[col] = s.astype("category")
+        elif col in FLOAT32_COLUMNS:
+            cols[col] = pd.to_numeric(s, errors="coerce").astype("float32")
+        elif col in FLOAT64_COLUMNS:
+            cols[col] = pd.to_numeric(s, errors="coerce").astype("float64")
+        else:
+            cols[col] = s
+
+    out = pd.DataFrame(cols, index=df.index)
+    out.attrs.update(df.attrs)
+
+    if "Timestamp Start" in out.columns:
+        ts = out["Timestamp Start"]
+        out["Year"] = ts.dt.year.astype("Int16")
+        out["Month"] = ts.dt.to_period("M").astype(str).astype("category")
+        out["Week"] = ts.dt.to_period("W").astype(str).astype("category")
+
+    # rows grouped by Location so each location is a contiguous slice
+    if "Location" in out.columns:
+        codes = out["Location"].cat.codes.to_numpy()
+        out = out.iloc[np.argsort(codes, kind="stable")]
+
+    return out
+
+
+def to_log_frame(df):
+    # back to the CSV's shape (file row order, text timestamps, plain
+    # strings) for editing and writing; the compact frame stays the one
+    # the session holds
+    out = df.drop(columns=[c for c in DERIVED_COLUMNS if c in df.columns]).sort_index()
+
+    for col in TIMESTAMP_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].dt.strftime(TIMESTAMP_FORMAT)
+    for col in CATEGORY_COLUMNS:
+        if col in out.columns:
+            out[col] = out[col].astype(object)
+
+    out.attrs.update(df.attrs)
+    return out
+
+
+def location_view(df, location):
+    if location == "All":
+        return df
+
+    codes = df["Location"].cat.codes.to_numpy()
+    categories = df["Location"].cat.categories
+
+    if location not in categories:
+        return df.iloc[0:0]
+
+    code = categories.get_loc(location)
+    start = np.searchsorted(codes, code, side="left")
+    stop = np.searchsorted(codes, code, side="right")
+
+    return df.iloc[start:stop]
+
+
+def frame_bytes(df):
+    return int(df.memory_usage(deep=True).sum())
+
+
+def memory_report(raw, compact):
+    # the parsed CSV is dropped once compacted, only the compact frame is kept
+    raw_bytes = frame_bytes(raw)
+    compact_bytes = frame_bytes(compact)
+
+    return {
+        "rows": len(raw),
+        "raw_bytes": raw_bytes,
+        "compact_bytes": compact_bytes,
+        "saved_pct": round(100 * (1 - compact_bytes / raw_bytes), 1) if raw_bytes else 0.0
+    }
@@ -1,21 +1,80 @@
+import hashlib
+import json
 import os
-import boto3
-from flask import Flask, Response
+import threading
+import time
+from flask import Flask, Response, abort, jsonify, redirect, request, stream_with_context
+
+from s3_utils import get_s3
+from s3_links import get_cached_presigned_url
+
+# pandas-backed modules (snapshots, compact_log, forecast) are imported
+# inside the routes that need them, so health checks and the CSV export
+# never load pandas.
 
 app = Flask(__name__)
 
-S3_BUCKET = os.environ["S3_BUCKET"]
+S3_BUCKET = os.environ.get("S3_BUCKET")
 LOG_FILE = "charging_log.csv"
 
-s3 = boto3.client("s3")
+# "presigned" redirects to S3 so export bytes never pass through this
+# process; "proxy" (opt-in) streams the CSV through it
+EXPORT_MODE = os.environ.get("EXPORT_MODE", "presigned")
+STREAM_CHUNK_SIZE = 64 * 1024
+
+# analytics responses are cached per (path, query, log ETag); the log ETag
+# itself is re-checked at most every LOG_ETAG_TTL seconds, so polls inside
+# that window cost no S3 request at all
+LOG_ETAG_TTL = int(os.environ.get("LOG_ETAG_TTL_SECONDS", 30))
+RESPONSE_CACHE_SIZE = 256
+
+_log_state = {"etag": None, "checked": 0.0, "df": None, "df_etag": None}
+_responses = {}
+_cache_lock = threading.Lock()
+
+
+def clear_response_cache():
+    with _cache_lock:
+        _responses.clear()
+        _log_state.update({"etag": None, "checked": 0.0, "df": None, "df_etag": None})
+
+
+@app.before_request
+def require_bucket():
+    # everything but the health check needs S3
+    if S3_BUCKET is None and request.endpoint not in (None, "health"):
+        abort(503)
+
+
+@app.route("/health")
+def health():
+    return jsonify({"status": "ok", "bucket_configured": S3_BUCKET is not None})
+
 
 @app.route("/export/log")
 def export_log():
-    obj = s3.get_object(Bucket=S3_BUCKET, Key=LOG_FILE)
-    csv_data = obj["Body"].read()
+    as_of = request.args.get("as_of")
+
+    if as_of is not None:
+        from versioned_store import object_key, version_as_of
+
+        try:
+            version = version_as_of(LOG_FILE, as_of)
+        except ValueError:
+            abort(400)
+        if version is None:
+            abort(404)
+        key = object_key(version["hash"])
+    else:
+        key = LOG_FILE
+
+    if request.args.get("mode", EXPORT_MODE) == "presigned":
+        return redirect(get_cached_presigned_url(key), code=302)
+
+    obj = get_s3().get_object(Bucket=S3_BUCKET, Key=key)
 
     return Response(
-        csv_data,
+        stream_with_context(obj["Body"].iter_chunks(STREAM_CHUNK_SIZE)),
         mimetype="text/csv",
         headers={
             "Content-Disposition": "attachment; filename=charging_log.csv",
@@ -23,5 +82,174 @@ def export_log():
         }
     )
 
+
+@app.route("/export/snapshots")
+def export_snapshots():
+    from snapshots import list_snapshots
+
+    return jsonify(list_snapshots())
+
+
+@app.route("/export/snapshots/<month>")
+def export_snapshot(month):
+    from snapshots import SNAPSHOT_FORMATS, snapshot_exists, snapshot_key
+
+    fmt = request.args.get("format", "csv")
+    location = request.args.get("location")
+
+    if fmt not in SNAPSHOT_FORMATS:
+        abort(400)
+
+    key = snapshot_key(month, fmt, location)
+    if not snapshot_exists(key):
+        abort(404)
+
+    return redirect(get_cached_presigned_url(key), code=302)
+
+
+# ---------- Analytics ----------
+
+def current_log_etag():
+    now = time.monotonic()
+
+    with _cache_lock:
+        if _log_state["etag"] is not None and now - _log_state["checked"] < LOG_ETAG_TTL:
+            return _log_state["etag"]
+
+    from botocore.exceptions import ClientError
+
+    try:
+        etag = get_s3().head_object(Bucket=S3_BUCKET, Key=LOG_FILE)["ETag"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            abort(404)
+        raise
+
+    with _cache_lock:
+        _log_state["etag"] = etag
+        _log_state["checked"] = now
+
+    return etag
+
+
+def load_log(etag):
+    from compact_log import compact_log
+    from s3_utils import read_csv_s3
+
+    with _cache_lock:
+        if _log_state["df_etag"] == etag:
+            return _log_state["df"]
+
+    df = compact_log(read_csv_s3(LOG_FILE))
+
+    # the log may have been rewritten since the HEAD; cache what was
+    # actually read under its own ETag
+    read_etag = df.attrs.get("etag")
+    if read_etag is not None:
+        with _cache_lock:
+            _log_state["df"] = df
+            _log_state["df_etag"] = read_etag
+            _log_state["etag"] = read_etag
+
+    return df
+
+
+def records(df):
+    return json.loads(df.to_json(orient="records", date_format="iso"))
+
+
+def finite(summary):
+    # NaN (e.g. median of no sessions) is not valid JSON
+    return {k: (None if v != v else v) for k, v in summary.items()}
+
+
+def analytics_response(compute, extra_key=None):
+    def cache_key(log_etag):
+        return (request.path, tuple(sorted(request.args.items())), log_etag, extra_key)
+
+    key = cache_key(current_log_etag())
+
+    with _cache_lock:
+        cached = _responses.get(key)
+
+    if cached is None:
+        df = load_log(key[2])
+        if len(df) == 0:
+            abort(404)
+
+        key = cache_key(df.attrs.get("etag"))
+        body = json.dumps(compute(df))
+        cached = (body, hashlib.md5(f"{key}".encode()).hexdigest())
+
+        with _cache_lock:
+            _responses[key] = cached
+            while len(_responses) > RESPONSE_CACHE_SIZE:
+                _responses.pop(next(iter(_responses)))
+
+    body, tag = cached
+    resp = Response(body, mimetype="application/json")
+    resp.set_etag(tag)
+    resp.headers["Cache-Control"] = f"private, max-age={LOG_ETAG_TTL}"
+
+    return resp.make_conditional(request)
+
+
+def analytics_args():
+    from analytics import LOCATION_FILTERS, PERIODS
+
+    period = request.args.get("period", "Month")
+    location = request.args.get("location", "All")
+
+    if period not in PERIODS or location not in LOCATION_FILTERS:
+        abort(400)
+
+    return period, location
+
+
+@app.route("/analytics/costs")
+def analytics_costs():
+    from analytics import cost_insights
+
+    period, location = analytics_args()
+
+    def compute(df):
+        _, agg, kpis = cost_insights(df, period, location)
+        return {"period": period, "location": location, "summary": finite(kpis), "rows": records(agg)}
+
+    return analytics_response(compute)
+
+
+@app.route("/analytics/performance")
+def analytics_performance():
+    from analytics import performance_insights
+
+    period, location = analytics_args()
+
+    def compute(df):
+        _, agg, kpis = performance_insights(df, period, location)
+        return {"period": period, "location": location, "summary": finite(kpis), "rows": records(agg)}
+
+    return analytics_response(compute)
+
+
+@app.route("/analytics/forecast")
+def analytics_forecast():
+    from forecast import PERIOD_FREQ, current_period, forecast_next
+
+    period = request.args.get("period", "Month")
+    by = request.args.get("by", "Location").split(",")
+
+    if period not in PERIOD_FREQ or not set(by) <= {"Location", "Company"} or len(set(by)) != len(by):
+        abort(400)
+
+    # the forecast moves on with the calendar even when the log doesn't
+    return analytics_response(
+        lambda df: records(forecast_next(df, period, by)),
+        extra_key=str(current_period(period))
+    )
+
+
+# snapshots are generated by their own job: python snapshots.py
+
 if __name__ == "__main__":
     app.run(host="0.0.0.0", port=int(os.environ.get("PORT", 10000)))
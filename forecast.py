@@ -0,0 +1,134 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+PERIOD_FREQ = {"Week": "W", "Month": "M"}
+SEASON_LENGTH = {"Week": 52, "Month": 12}
+
+# number of recent periods the level and trend are fitted on
+TREND_WINDOW = 6
+
+_cache = {}
+_cache_lock = threading.Lock()
+CACHE_SIZE = 32
+
+
+def current_period(period, now=None):
+    now = now if now is not None else pd.Timestamp.now()
+    return pd.Period(now, freq=PERIOD_FREQ[period])
+
+
+def clear_forecast_cache():
+    with _cache_lock:
+        _cache.clear()
+
+
+def period_matrix(df, period, by, value_cols, now=None):
+    # groups x periods matrices over the completed periods up to `now`,
+    # with empty periods filled with 0; the period in progress is left out
+    # so a half-finished month doesn't drag the trend down
+    current = current_period(period, now)
+    periods = pd.to_datetime(df["Timestamp Start"], errors="coerce").dt.to_period(PERIOD_FREQ[period])
+    valid = periods.notna() & (periods < current)
+    df, periods = df[valid], periods[valid]
+
+    if len(periods) == 0:
+        return None, None, {}
+
+    full_range = pd.period_range(periods.min(), current - 1, freq=PERIOD_FREQ[period])
+
+    sums = (
+        df.assign(_Period=periods)
+          .groupby(list(by) + ["_Period"], observed=True, dropna=False)[value_cols]
+          .sum()
+    )
+
+    matrices = {}
+    groups = None
+    for col in value_cols:
+        wide = sums[col].unstack("_Period").reindex(columns=full_range, fill_value=0).fillna(0)
+        groups = wide.index
+        matrices[col] = wide.to_numpy(dtype="float64")
+
+    return groups, full_range, matrices
+
+
+def project(y, season=None, window=TREND_WINDOW):
+    # next-period value for each row of y: linear trend over the last
+    # `window` periods, scaled by last year's seasonal index when available
+    n_groups, n_periods = y.shape
+    k = min(window, n_periods)
+    recent = y[:, -k:]
+
+    t = np.arange(k, dtype="float64")
+    t_centered = t - t.mean()
+    denom = (t_centered ** 2).sum()
+
+    level = recent.mean(axis=1)
+    slope = (recent - level[:, None]) @ t_centered / denom if denom > 0 else np.zeros(n_groups)
+    trend = level + slope * (k - t.mean())
+
+    if season and n_periods >= season:
+        last_season = y[:, -season:]
+        season_mean = last_season.mean(axis=1)
+        same_period_last_year = last_season[:, 0]
+        index = np.divide(
+            same_period_last_year,
+            season_mean,
+            out=np.ones(n_groups),
+            where=season_mean > 0
+        )
+        trend = trend * np.clip(index, 0.5, 2.0)
+
+    return np.clip(trend, 0, None)
+
+
+def forecast_next(df, period="Month", by=("Location",), now=None):
+    # projects the current calendar period from the completed ones before it
+    by = list(by)
+    columns = by + ["Period", "Last_kWh", "Last_Cost", "Forecast_kWh", "Forecast_Cost", "Forecast_Cost_per_kWh"]
+
+    if len(df) == 0:
+        return pd.DataFrame(columns=columns)
+
+    groups, full_range, m = period_matrix(df, period, by, ["kWh", "Total Cost"], now)
+    if groups is None:
+        return pd.DataFrame(columns=columns)
+
+    season = SEASON_LENGTH.get(period)
+
+    kwh = project(m["kWh"], season)
+    cost = project(m["Total Cost"], season)
+
+    out = groups.to_frame(index=False)
+    out["Period"] = str(full_range[-1] + 1)
+    out["Last_kWh"] = m["kWh"][:, -1]
+    out["Last_Cost"] = m["Total Cost"][:, -1]
+    out["Forecast_kWh"] = kwh
+    out["Forecast_Cost"] = cost
+    out["Forecast_Cost_per_kWh"] = np.divide(cost, kwh, out=np.full(len(kwh), np.nan), where=kwh > 0)
+
+    return out[columns].round(2)
+
+
+def cached_forecast(df, period="Month", by=("Location",)):
+    # results are keyed by the log version (S3 ETag) and the period being
+    # forecast, so reruns on an unchanged log skip the projection
+    version = df.attrs.get("etag")
+    key = (version, period, tuple(by), str(current_period(period)))
+
+    if version is not None:
+        with _cache_lock:
+            if key in _cache:
+                return _cache[key]
+
+    result = forecast_next(df, period, by)
+
+    if version is not None:
+        with _cache_lock:
+            _cache[key] = result
+            while len(_cache) > CACHE_SIZE:
+                _cache.pop(next(iter(_cache)))
+
+    return result
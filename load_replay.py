@@ -0,0 +1,393 @@
+import argparse
+import asyncio
+import os
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+# Load-replay harness: concurrent virtual users replay the app's flows
+# (login, start/finish session, browsing, History edits, exports) against
+# an in-memory S3 stand-in with injectable latency.
+#
+#   python load_replay.py --scenario all --users 20 --iterations 10 --latency-ms 40
+#
+# app.py is a Streamlit script and can't be imported, so `app_rerun` below
+# mirrors the reads and computations one script run performs; keep it in
+# step with app.py when the page changes.
+
+os.environ.setdefault("S3_BUCKET", "load-replay")
+
+import pandas as pd
+
+import export_service
+import forecast
+import log_quality
+import s3_links
+import versioned_store
+from analytics import cost_insights, performance_insights
+from auth_utils import load_password
+from compact_log import compact_log, memory_report, to_log_frame
+from local_s3 import LocalS3
+from pricing import optimize_charge_window
+from s3_utils import read_csv_s3, use_s3_client, write_csv_s3
+
+LOG_FILE = "charging_log.csv"
+HOUSE_PRICE_FILE = "house_prices.csv"
+PUBLIC_PRICE_FILE = "public_prices.csv"
+CONFIG_FILE = "config.csv"
+SESSION_FILE = "open_session.csv"
+AUTH_FILE = "auth_config.csv"
+
+PASSWORD = "replay"
+
+LOG_COLUMNS = [
+    "Timestamp Start",
+    "Timestamp End",
+    "Duration Hours",
+    "Location",
+    "Company",
+    "Battery Start %",
+    "Battery End %",
+    "Range Start",
+    "Range End",
+    "kWh",
+    "Price per kWh",
+    "Total Cost"
+]
+
+SESSION_COLUMNS = ["Timestamp Start", "Location", "Company", "Battery Start %", "Range Start"]
+
+# flow -> weight
+SCENARIOS = {
+    "browse": {"login": 1, "browse": 6, "export": 3},
+    "mixed": {"login": 1, "browse": 4, "start_session": 1, "finish_session": 2, "edit_history": 1, "export": 1},
+    "write_heavy": {"browse": 1, "start_session": 1, "finish_session": 4, "edit_history": 3},
+}
+
+
+# ---------- Seed data ----------
+
+def seed(log_rows, rng):
+    write_csv_s3(pd.DataFrame([{"password": PASSWORD}]), AUTH_FILE)
+    write_csv_s3(pd.DataFrame([{"BatteryCapacity_kWh": 64, "FullRange": 260}]), CONFIG_FILE)
+    write_csv_s3(pd.DataFrame([{
+        "Start Time": "00:30:00", "End Time": "05:30:00",
+        "Price A": 0.075, "Price B": 0.245, "Additional Price": 0
+    }]), HOUSE_PRICE_FILE)
+    write_csv_s3(pd.DataFrame([{
+        "Company": "Ionity", "Start Time": "00:00:00", "End Time": "23:59:00",
+        "Price A": 0.69, "Price B": 0.69, "Additional Price": 0
+    }]), PUBLIC_PRICE_FILE)
+    write_csv_s3(pd.DataFrame(columns=SESSION_COLUMNS), SESSION_FILE)
+
+    rows = []
+    start = datetime(2024, 1, 1, 21, 0)
+    for i in range(log_rows):
+        ts = start + timedelta(hours=31 * i)
+        home = rng.random() < 0.7
+        hours = round(rng.uniform(1, 8) if home else rng.uniform(0.3, 1), 2)
+        kwh = round(hours * (7 if home else 50) * rng.uniform(0.85, 1.0), 2)
+        price = 0.09 if home else 0.69
+        rows.append({
+            "Timestamp Start": ts.strftime("%Y-%m-%d %H:%M:%S"),
+            "Timestamp End": (ts + timedelta(hours=hours)).strftime("%Y-%m-%d %H:%M:%S"),
+            "Duration Hours": hours,
+            "Location": "Home" if home else "Public",
+            "Company": "" if home else "Ionity",
+            "Battery Start %": 20,
+            "Battery End %": 80,
+            "Range Start": 0,
+            "Range End": 0,
+            "kWh": kwh,
+            "Price per kWh": price,
+            "Total Cost": round(kwh * price, 2)
+        })
+    write_csv_s3(pd.DataFrame(rows, columns=LOG_COLUMNS), LOG_FILE)
+
+
+def reset_caches():
+    # process-wide caches would otherwise carry over between scenarios
+    log_quality.clear_check_cache()
+    forecast.clear_forecast_cache()
+    versioned_store.clear_manifest_cache()
+    export_service.clear_response_cache()
+    s3_links.clear_url_cache()
+
+
+# ---------- App mirror ----------
+
+def app_rerun(period="Month", location="All"):
+    # top of app.py: check_password + table loads
+    load_password()
+    house_prices = read_csv_s3(HOUSE_PRICE_FILE)
+    read_csv_s3(PUBLIC_PRICE_FILE)
+    log_df = read_csv_s3(LOG_FILE, LOG_COLUMNS)
+    log_compact = compact_log(log_df)
+    memory_report(log_df, log_compact)
+    del log_df
+    config = read_csv_s3(CONFIG_FILE)
+
+    # every tab body runs on every script run
+    performance_insights(log_compact, period, location)
+    cost_insights(log_compact, period, location)
+    forecast.cached_forecast(log_compact, "Month", ["Location"])
+
+    session = read_csv_s3(SESSION_FILE, SESSION_COLUMNS)
+    optimize_charge_window(
+        house_prices.iloc[0], 20, 80, float(config.iloc[0]["BatteryCapacity_kWh"]), 7.0
+    )
+
+    log_view = to_log_frame(log_compact)
+    log_view.copy()
+    log_quality.flagged_rows(log_view, log_quality.check_log(log_view))
+
+    return log_compact, session
+
+
+class User:
+
+    def __init__(self, index, rng, ledger):
+        self.index = index
+        self.rng = rng
+        self.ledger = ledger
+        self.seq = 0
+        self.markers = []
+
+    def next_id(self):
+        self.seq += 1
+        # small enough to stay exact in the compact log's float32 Range Start
+        return self.index * 10_000 + self.seq
+
+    # ---------- flows ----------
+
+    def login(self):
+        # first run stops at the password prompt, the second is the app
+        if load_password() != PASSWORD:
+            raise RuntimeError("login failed")
+        app_rerun()
+
+    def browse(self):
+        app_rerun(self.rng.choice(["Week", "Month", "Year"]), self.rng.choice(["All", "Home", "Public"]))
+
+    def start_session(self):
+        app_rerun()
+        write_csv_s3(pd.DataFrame([{
+            "Timestamp Start": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "Location": "Home",
+            "Company": "",
+            "Battery Start %": 20,
+            "Range Start": 0
+        }]), SESSION_FILE)
+        app_rerun()
+
+    def finish_session(self):
+        log_compact, _ = app_rerun()
+
+        # the marker rides in Range Start so the row can be found afterwards
+        marker = self.next_id()
+        now = datetime.now()
+        new_row = pd.DataFrame([{
+            "Timestamp Start": (now - timedelta(hours=4)).strftime("%Y-%m-%d %H:%M:%S"),
+            "Timestamp End": now.strftime("%Y-%m-%d %H:%M:%S"),
+            "Duration Hours": 4,
+            "Location": "Home",
+            "Company": "",
+            "Battery Start %": 30,
+            "Battery End %": 70,
+            "Range Start": marker,
+            "Range End": 0,
+            "kWh": 25.6,
+            "Price per kWh": 0.09,
+            "Total Cost": 2.3
+        }])
+
+        log_df = pd.concat([to_log_frame(log_compact), new_row], ignore_index=True)[LOG_COLUMNS]
+        write_csv_s3(log_df, LOG_FILE)
+        self.ledger.appended(marker)
+        self.markers.append(marker)
+
+        write_csv_s3(pd.DataFrame(columns=SESSION_COLUMNS), SESSION_FILE)
+        app_rerun()
+
+    def edit_history(self):
+        # False when there was nothing of this user's to edit, so the
+        # runner leaves the no-op out of the flow stats
+        log_compact, _ = app_rerun()
+        if not self.markers:
+            return False
+
+        history_df = to_log_frame(log_compact)
+        marker = self.rng.choice(self.markers)
+        rows = history_df["Range Start"] == marker
+        if not rows.any():
+            return False
+
+        value = float(self.next_id())
+        history_df.loc[rows, "Total Cost"] = value
+        write_csv_s3(history_df, LOG_FILE)
+        self.ledger.edited(marker, value)
+        app_rerun()
+
+    def export(self):
+        client = export_service.app.test_client()
+        client.get("/export/log").get_data()
+        client.get(f"/analytics/costs?period={self.rng.choice(['Week', 'Month', 'Year'])}")
+
+
+class Ledger:
+
+    # what every user believes it wrote, checked against the final log
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.appends = set()
+        self.edits = {}
+
+    def appended(self, marker):
+        with self.lock:
+            self.appends.add(marker)
+
+    def edited(self, marker, value):
+        with self.lock:
+            self.edits[marker] = value
+
+    def lost_writes(self):
+        final = read_csv_s3(LOG_FILE)
+        markers = pd.to_numeric(final["Range Start"], errors="coerce")
+        costs = dict(zip(markers, pd.to_numeric(final["Total Cost"], errors="coerce")))
+
+        lost_appends = len(self.appends - set(markers))
+        lost_edits = sum(
+            1 for marker, value in self.edits.items()
+            if marker in costs and costs[marker] != value
+        )
+        return lost_appends, lost_edits
+
+
+# ---------- Runner ----------
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+async def run_user(user, mix, iterations, latencies, errors, skipped):
+    names = list(mix)
+    weights = [mix[n] for n in names]
+
+    for _ in range(iterations):
+        flow = user.rng.choices(names, weights)[0]
+        t0 = time.perf_counter()
+        try:
+            done = await asyncio.to_thread(getattr(user, flow))
+        except Exception as e:
+            errors[f"{flow}: {type(e).__name__}"] += 1
+            done = None
+        if done is False:
+            skipped[flow] += 1
+            continue
+        latencies[flow].append(time.perf_counter() - t0)
+
+
+async def run_scenario(name, users, iterations, latency, jitter, log_rows, seed_value):
+    rng = random.Random(seed_value)
+
+    s3 = LocalS3()
+    use_s3_client(s3)
+    reset_caches()
+    seed(log_rows, rng)
+
+    # latency and call counts only apply to the replay itself
+    s3.latency, s3.jitter = latency, jitter
+    s3.calls.clear()
+    reset_caches()
+
+    ledger = Ledger()
+    latencies = defaultdict(list)
+    errors = Counter()
+    skipped = Counter()
+
+    loop = asyncio.get_running_loop()
+    loop.set_default_executor(ThreadPoolExecutor(max_workers=users))
+
+    started = time.perf_counter()
+    await asyncio.gather(*[
+        run_user(User(i + 1, random.Random(rng.random()), ledger), SCENARIOS[name], iterations, latencies, errors, skipped)
+        for i in range(users)
+    ])
+    elapsed = time.perf_counter() - started
+
+    calls = dict(s3.calls)
+    lost_appends, lost_edits = ledger.lost_writes()
+
+    return {
+        "scenario": name,
+        "elapsed": elapsed,
+        "flows": sum(len(v) for v in latencies.values()),
+        "latencies": latencies,
+        "errors": errors,
+        "skipped": skipped,
+        "s3_calls": calls,
+        "lost_appends": lost_appends,
+        "attempted_appends": len(ledger.appends),
+        "lost_edits": lost_edits,
+        "attempted_edits": len(ledger.edits),
+    }
+
+
+def print_report(result, users, latency_ms):
+    flows = result["flows"]
+    elapsed = result["elapsed"]
+    total_calls = sum(result["s3_calls"].values())
+
+    print(f"\n=== {result['scenario']}: {users} users, S3 latency {latency_ms:g} ms ===")
+    print(f"flows: {flows} in {elapsed:.2f}s  ->  {flows / elapsed:.1f} flows/s")
+
+    print(f"{'flow':16} {'n':>5} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9}")
+    for flow, values in sorted(result["latencies"].items()):
+        ms = [v * 1000 for v in values]
+        print(f"{flow:16} {len(ms):5d} {percentile(ms, 50):9.1f} {percentile(ms, 95):9.1f} "
+              f"{percentile(ms, 99):9.1f} {max(ms):9.1f}")
+
+    print(f"S3 calls: {total_calls} ({total_calls / max(flows, 1):.1f} per flow)  "
+          + ", ".join(f"{k}={v}" for k, v in sorted(result["s3_calls"].items())))
+    print(f"lost writes: {result['lost_appends']}/{result['attempted_appends']} appended sessions, "
+          f"{result['lost_edits']}/{result['attempted_edits']} history edits")
+
+    if result["skipped"]:
+        print("skipped (nothing to do, not in stats): "
+              + ", ".join(f"{k} x{v}" for k, v in result["skipped"].items()))
+
+    if result["errors"]:
+        print("errors: " + ", ".join(f"{k} x{v}" for k, v in result["errors"].items()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay concurrent user flows against a local S3 stand-in.")
+    parser.add_argument("--scenario", choices=list(SCENARIOS) + ["all"], default="all")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=10, help="flows per user")
+    parser.add_argument("--latency-ms", type=float, default=30.0, help="added to every S3 call")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--log-rows", type=int, default=500, help="sessions in the seeded log")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    names = list(SCENARIOS) if args.scenario == "all" else [args.scenario]
+
+    for name in names:
+        result = asyncio.run(run_scenario(
+            name, args.users, args.iterations,
+            args.latency_ms / 1000, args.jitter_ms / 1000,
+            args.log_rows, args.seed
+        ))
+        print_report(result, args.users, args.latency_ms)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,216 @@
+import hashlib
+import io
+import os
+import random
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from urllib.parse import quote
+
+from botocore.exceptions import ClientError
+
+
+class _Body(io.BytesIO):
+
+    # botocore's StreamingBody API, as used by the streaming export
+    def iter_chunks(self, chunk_size=1024):
+        while True:
+            chunk = self.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+
+class _ListPaginator:
+
+    # list_objects_v2 pages of at most PageSize keys (1000, as on S3)
+    def __init__(self, client):
+        self.client = client
+
+    def paginate(self, Bucket, Prefix="", PaginationConfig=None):
+        page_size = (PaginationConfig or {}).get("PageSize", 1000)
+        contents = self.client.list_objects_v2(Bucket=Bucket, Prefix=Prefix)["Contents"]
+        for i in range(0, max(len(contents), 1), page_size):
+            page = contents[i:i + page_size]
+            yield {"Contents": page, "KeyCount": len(page), "IsTruncated": i + page_size < len(contents)}
+
+
+# Stand-in for the subset of the boto3 S3 client the app uses.
+# Objects live in memory, or under `root/<bucket>/<key>` when a root
+# directory is given so several processes (app + export service) can share it.
+# `latency` / `jitter` (seconds) are added to every call to mimic a remote S3.
+class LocalS3:
+
+    def __init__(self, root=None, url_base="http://local-s3", latency=0.0, jitter=0.0):
+        self.root = root
+        self.url_base = url_base
+        self.latency = latency
+        self.jitter = jitter
+        self.calls = Counter()
+        self._objects = {}
+        self._lock = threading.Lock()
+
+    # ---------- storage ----------
+
+    def _path(self, bucket, key):
+        return os.path.join(self.root, bucket, *key.split("/"))
+
+    def _load(self, bucket, key):
+        if self.root is None:
+            return self._objects.get((bucket, key))
+
+        path = self._path(bucket, key)
+        if not os.path.isfile(path):
+            return None
+        with open(path, "rb") as f:
+            body = f.read()
+        return body, os.path.getmtime(path)
+
+    def _store(self, bucket, key, body):
+        if self.root is None:
+            self._objects[(bucket, key)] = (body, time.time())
+            return
+
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp-{threading.get_ident()}"
+        with open(tmp, "wb") as f:
+            f.write(body)
+        os.replace(tmp, path)
+
+    def _keys(self, bucket):
+        if self.root is None:
+            return [k for (b, k) in self._objects if b == bucket]
+
+        base = os.path.join(self.root, bucket)
+        keys = []
+        for dirpath, _, files in os.walk(base):
+            for name in files:
+                if ".tmp-" in name:
+                    continue
+                rel = os.path.relpath(os.path.join(dirpath, name), base)
+                keys.append(rel.replace(os.sep, "/"))
+        return keys
+
+    @staticmethod
+    def _etag(body):
+        return '"' + hashlib.md5(body).hexdigest() + '"'
+
+    @staticmethod
+    def _missing(operation, code="NoSuchKey"):
+        return ClientError(
+            {"Error": {"Code": code, "Message": "The specified key does not exist."}},
+            operation
+        )
+
+    @staticmethod
+    def _precondition_failed(operation):
+        return ClientError(
+            {"Error": {"Code": "PreconditionFailed", "Message": "At least one of the pre-conditions you specified did not hold"}},
+            operation
+        )
+
+    def _meta(self, body, mtime):
+        return {
+            "ETag": self._etag(body),
+            "ContentLength": len(body),
+            "LastModified": datetime.fromtimestamp(mtime, tz=timezone.utc)
+        }
+
+    def _call(self, name, remote=True):
+        with self._lock:
+            self.calls[name] += 1
+        if remote and (self.latency or self.jitter):
+            time.sleep(self.latency + random.uniform(0, self.jitter))
+
+    # ---------- client API ----------
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, **kwargs):
+        self._call("get_object")
+        with self._lock:
+            found = self._load(Bucket, Key)
+        if found is None:
+            raise self._missing("GetObject")
+
+        body, mtime = found
+        if IfNoneMatch is not None and IfNoneMatch == self._etag(body):
+            # botocore surfaces a conditional GET hit as a 304 ClientError
+            raise ClientError({"Error": {"Code": "304", "Message": "Not Modified"}}, "GetObject")
+
+        return {"Body": _Body(body), **self._meta(body, mtime)}
+
+    def head_object(self, Bucket, Key, **kwargs):
+        self._call("head_object")
+        with self._lock:
+            found = self._load(Bucket, Key)
+        if found is None:
+            raise self._missing("HeadObject", code="404")
+
+        return self._meta(*found)
+
+    def put_object(self, Bucket, Key, Body, IfMatch=None, IfNoneMatch=None, **kwargs):
+        self._call("put_object")
+        if isinstance(Body, str):
+            Body = Body.encode("utf-8")
+        with self._lock:
+            # conditional writes, as S3 does for If-Match / If-None-Match: *
+            if IfMatch is not None or IfNoneMatch is not None:
+                found = self._load(Bucket, Key)
+                current = self._etag(found[0]) if found else None
+                if IfNoneMatch == "*" and current is not None:
+                    raise self._precondition_failed("PutObject")
+                if IfMatch is not None and current != IfMatch:
+                    raise self._precondition_failed("PutObject")
+            self._store(Bucket, Key, bytes(Body))
+        return {"ETag": self._etag(Body)}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        self._call("copy_object")
+        with self._lock:
+            found = self._load(CopySource["Bucket"], CopySource["Key"])
+            if found is None:
+                raise self._missing("CopyObject")
+            self._store(Bucket, Key, found[0])
+        return {"CopyObjectResult": {"ETag": self._etag(found[0])}}
+
+    def delete_object(self, Bucket, Key, **kwargs):
+        self._call("delete_object")
+        with self._lock:
+            if self.root is None:
+                self._objects.pop((Bucket, Key), None)
+            elif os.path.isfile(self._path(Bucket, Key)):
+                os.remove(self._path(Bucket, Key))
+        return {}
+
+    def list_objects_v2(self, Bucket, Prefix="", **kwargs):
+        self._call("list_objects_v2")
+        contents = []
+        with self._lock:
+            for key in sorted(self._keys(Bucket)):
+                if not key.startswith(Prefix):
+                    continue
+                body, mtime = self._load(Bucket, key)
+                meta = self._meta(body, mtime)
+                contents.append({
+                    "Key": key,
+                    "ETag": meta["ETag"],
+                    "Size": meta["ContentLength"],
+                    "LastModified": meta["LastModified"]
+                })
+
+        return {"Contents": contents, "KeyCount": len(contents), "IsTruncated": False}
+
+    def get_paginator(self, operation_name):
+        if operation_name != "list_objects_v2":
+            raise NotImplementedError(operation_name)
+        return _ListPaginator(self)
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        # signing is local in boto3 too, no round trip
+        self._call("generate_presigned_url", remote=False)
+        expires = int(time.time()) + int(ExpiresIn)
+        bucket = Params["Bucket"]
+        key = quote(Params["Key"])
+        signature = hashlib.sha1(f"{bucket}/{key}/{expires}".encode()).hexdigest()
+        return f"{self.url_base}/{bucket}/{key}?Expires={expires}&Signature={signature}"
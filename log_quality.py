@@ -0,0 +1,221 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Row-level data-quality flags for the charging log. All checks are
+# column-wise over the whole frame; when the log only grew by appended rows
+# starting after every earlier session (the Finish Charging path) just the
+# new rows are checked.
+
+NUMERIC_COLUMNS = [
+    "Duration Hours",
+    "Battery Start %",
+    "Battery End %",
+    "Range Start",
+    "Range End",
+    "kWh",
+    "Price per kWh",
+    "Total Cost",
+]
+
+# fastest plausible charge per location (home AC wallbox, public DC)
+MAX_SPEED_KW = {"Home": 22.0, "Public": 350.0}
+
+SPEED_WINDOW = 20           # previous sessions per Company used as baseline
+SPEED_MIN_PERIODS = 5
+SPEED_Z_LIMIT = 3.5
+SPEED_MIN_SCALE = 0.5       # kW, floor for the robust spread
+
+FLAGS = [
+    "unparseable_value",
+    "bad_timestamp",
+    "non_positive_duration",
+    "end_before_start",
+    "non_positive_kwh",
+    "battery_out_of_range",
+    "battery_not_increasing",
+    "implausible_speed",
+    "speed_outlier",
+    "overlapping_session",
+]
+
+_state = {}
+_state_lock = threading.Lock()
+
+
+def clear_check_cache():
+    with _state_lock:
+        _state.clear()
+
+
+def schema_issues(df, columns):
+    issues = [f"missing column: {c}" for c in columns if c not in df.columns]
+    issues += [f"unexpected column: {c}" for c in df.columns if c not in columns]
+    return issues
+
+
+def _column(df, col, default=None):
+    if col in df.columns:
+        return df[col]
+    return pd.Series(default, index=df.index, dtype=object)
+
+
+def _typed(df):
+    cols = {}
+    bad = np.zeros(len(df), dtype=bool)
+
+    for col in ["Timestamp Start", "Timestamp End"]:
+        cols[col] = pd.to_datetime(_column(df, col), errors="coerce")
+
+    for col in NUMERIC_COLUMNS:
+        raw = _column(df, col)
+        cols[col] = pd.to_numeric(raw, errors="coerce")
+        bad |= (raw.notna() & cols[col].isna()).to_numpy()
+
+    cols["Location"] = _column(df, "Location", "").fillna("").astype(str)
+    cols["Company"] = _column(df, "Company", "").fillna("").astype(str)
+
+    return pd.DataFrame(cols, index=df.index), pd.Series(bad, index=df.index)
+
+
+def _speed_outliers(t, speed):
+    # robust z-score of each session's speed against the previous
+    # SPEED_WINDOW sessions of the same Location/Company, in start-time
+    # order whatever the file order (History saves newest-first)
+    order = t["Timestamp Start"].sort_values(kind="stable").index
+    ordered = speed.loc[order]
+    keys = [t["Location"].loc[order], t["Company"].loc[order]]
+
+    previous = ordered.groupby(keys).shift(1)
+    grouped = previous.groupby(keys)
+
+    def rolling(q):
+        return grouped.transform(lambda s: s.rolling(SPEED_WINDOW, min_periods=SPEED_MIN_PERIODS).quantile(q))
+
+    median = rolling(0.5)
+    spread = ((rolling(0.75) - rolling(0.25)) / 1.349).clip(lower=SPEED_MIN_SCALE)
+    z = (ordered - median) / spread
+
+    return (z.abs() > SPEED_Z_LIMIT).reindex(speed.index)
+
+
+def check_rows(df, prior_max_end=None):
+    t, unparseable = _typed(df)
+    flags = {}
+
+    start, end = t["Timestamp Start"], t["Timestamp End"]
+    duration, kwh = t["Duration Hours"], t["kWh"]
+    bat_start, bat_end = t["Battery Start %"], t["Battery End %"]
+
+    flags["unparseable_value"] = unparseable
+    flags["bad_timestamp"] = start.isna() | end.isna()
+    flags["non_positive_duration"] = ~(duration > 0)
+    flags["end_before_start"] = end < start
+    flags["non_positive_kwh"] = ~(kwh > 0)
+    flags["battery_out_of_range"] = ~bat_start.between(0, 100) | ~bat_end.between(0, 100)
+
+    # 0 -> 0 is what the form saves when the battery fields were left empty
+    entered = (bat_start > 0) | (bat_end > 0)
+    flags["battery_not_increasing"] = entered & (bat_end <= bat_start)
+
+    speed = kwh / duration.where(duration > 0)
+    max_speed = t["Location"].map(MAX_SPEED_KW).fillna(max(MAX_SPEED_KW.values()))
+    flags["implausible_speed"] = speed > max_speed
+    flags["speed_outlier"] = _speed_outliers(t, speed)
+
+    # a session starting before an earlier-starting one has ended
+    order = start.sort_values(kind="stable").index
+    running_end = end.loc[order].cummax().shift(1)
+    if prior_max_end is not None and not pd.isna(prior_max_end):
+        running_end = running_end.fillna(prior_max_end).clip(lower=prior_max_end)
+    flags["overlapping_session"] = (start.loc[order] < running_end).reindex(df.index)
+
+    return pd.DataFrame(flags, index=df.index)[FLAGS].astype(bool)
+
+
+def _row_key(df, i):
+    return tuple(df.iloc[i].astype(str))
+
+
+def _starts(df):
+    return pd.to_datetime(df["Timestamp Start"], errors="coerce")
+
+
+def _max_end(df):
+    return pd.to_datetime(df["Timestamp End"], errors="coerce").max() if "Timestamp End" in df.columns else None
+
+
+def _is_append(prev, df):
+    # appended rows that all start at or after every earlier session can't
+    # change the earlier rows' flags; anything else gets a full rescan
+    n = prev["n"]
+    if not (
+        n > 0
+        and len(df) > n
+        and list(df.columns) == prev["columns"]
+        and _row_key(df, 0) == prev["first"]
+        and _row_key(df, n - 1) == prev["last"]
+        and not pd.isna(prev["max_start"])
+    ):
+        return False
+
+    new_starts = _starts(df.iloc[n:])
+    return bool(new_starts.notna().all() and (new_starts >= prev["max_start"]).all())
+
+
+def check_log(df, name="charging_log"):
+    etag = df.attrs.get("etag")
+
+    with _state_lock:
+        prev = _state.get(name)
+
+    if prev is not None and etag is not None and prev["etag"] == etag and prev["n"] == len(df):
+        return prev["flags"]
+
+    if prev is not None and _is_append(prev, df):
+        n = prev["n"]
+        # the latest SPEED_WINDOW earlier sessions per Company, by start
+        # time, are enough for the rolling speed baseline
+        earlier = df.iloc[:n]
+        earlier = earlier.loc[_starts(earlier).sort_values(kind="stable").index]
+        context = earlier.groupby(
+            [earlier["Location"].fillna(""), earlier["Company"].fillna("")]
+        ).tail(SPEED_WINDOW)
+        tail = pd.concat([context, df.iloc[n:]])
+        new_flags = check_rows(tail, prior_max_end=prev["max_end"]).loc[df.index[n:]]
+        flags = pd.concat([prev["flags"], new_flags])
+        max_end = max(
+            (e for e in [prev["max_end"], _max_end(df.iloc[n:])] if not pd.isna(e)),
+            default=None
+        )
+        max_start = max(prev["max_start"], _starts(df.iloc[n:]).max())
+    else:
+        flags = check_rows(df)
+        max_end = _max_end(df)
+        max_start = _starts(df).max() if "Timestamp Start" in df.columns else None
+
+    with _state_lock:
+        _state[name] = {
+            "etag": etag,
+            "n": len(df),
+            "columns": list(df.columns),
+            "first": _row_key(df, 0) if len(df) else None,
+            "last": _row_key(df, len(df) - 1) if len(df) else None,
+            "max_end": max_end,
+            "max_start": max_start,
+            "flags": flags,
+        }
+
+    return flags
+
+
+def flagged_rows(df, flags):
+    hits = flags[flags.any(axis=1)]
+    hits = hits[hits.index.isin(df.index)]
+    issues = pd.Series(
+        [", ".join(f for f, hit in zip(FLAGS, row) if hit) for row in hits.to_numpy()],
+        index=hits.index,
+        dtype=object
+    )
+    return df.loc[hits.index].assign(Issues=issues)
@@ -0,0 +1,127 @@
+import math
+from datetime import datetime, time
+
+import numpy as np
+import pandas as pd
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_time(t):
+    if pd.isna(t):
+        return time(0, 0)
+
+    if isinstance(t, (float, int)) and not pd.isna(t):
+        hours = int(t)
+        minutes = int((t - hours) * 60)
+        return time(hours, minutes)
+
+    if isinstance(t, str):
+        try:
+            return datetime.strptime(t, "%H:%M:%S").time()
+        except:
+            return datetime.strptime(t, "%H:%M").time()
+
+    return time(0, 0)
+
+
+
+def get_weighted_price(row, start_dt, end_dt):
+    start = parse_time(row["Start Time"])
+    end = parse_time(row["End Time"])
+
+    price_a = float(row["Price A"])
+    price_b = float(row["Price B"])
+    add_p = float(row["Additional Price"])
+
+    total_cost = 0
+    total_hours = 0
+    current = start_dt
+
+    while current < end_dt:
+        nxt = min(current + pd.Timedelta(minutes=1), end_dt)
+        cur_time = current.time()
+
+        if start <= end:
+            in_range = start <= cur_time <= end
+        else:
+            in_range = cur_time >= start or cur_time <= end
+
+        price = price_a if in_range else price_b
+        total_cost += price * ((nxt - current).total_seconds() / 3600)
+        total_hours += (nxt - current).total_seconds() / 3600
+        current = nxt
+
+    return round((total_cost / total_hours) + add_p, 4)
+
+
+# ---------- Charging window optimizer ----------
+
+def _minute_of_day(t):
+    return t.hour * 60 + t.minute + t.second / 60
+
+
+def minute_prices(row):
+    # price (per kWh) for each minute of the day, same window rules as get_weighted_price
+    start = _minute_of_day(parse_time(row["Start Time"]))
+    end = _minute_of_day(parse_time(row["End Time"]))
+
+    minutes = np.arange(MINUTES_PER_DAY, dtype="float64")
+
+    if start <= end:
+        in_range = (minutes >= start) & (minutes <= end)
+    else:
+        in_range = (minutes >= start) | (minutes <= end)
+
+    return np.where(in_range, float(row["Price A"]), float(row["Price B"]))
+
+
+def charge_needed(bat_start, bat_target, battery_capacity):
+    return max(bat_target - bat_start, 0) / 100 * battery_capacity
+
+
+def optimize_charge_window(row, bat_start, bat_target, battery_capacity, charger_kw,
+                           earliest=None, ready_by=None):
+    kwh = charge_needed(bat_start, bat_target, battery_capacity)
+    if kwh <= 0 or charger_kw <= 0:
+        return None
+
+    earliest = pd.Timestamp(earliest or datetime.now()).floor("min")
+    duration = kwh / charger_kw * 60          # minutes, may be fractional
+    full = int(math.floor(duration))
+    frac = duration - full
+
+    # one candidate start per minute over the next 24h
+    offset = int(_minute_of_day(earliest.time()))
+    starts = np.arange(MINUTES_PER_DAY)
+
+    if ready_by is not None:
+        latest = (pd.Timestamp(ready_by) - earliest).total_seconds() / 60 - duration
+        starts = starts[starts <= latest]
+        if len(starts) == 0:
+            return None
+
+    # prices from `earliest` onwards, long enough for the last candidate to finish
+    day = minute_prices(row)
+    span = MINUTES_PER_DAY + full + 1
+    prices = np.tile(day, span // MINUTES_PER_DAY + 2)[offset:offset + span]
+
+    prefix = np.concatenate(([0.0], np.cumsum(prices)))
+    kwh_per_min = charger_kw / 60
+
+    costs = kwh_per_min * (prefix[starts + full] - prefix[starts] + frac * prices[starts + full])
+    costs += float(row["Additional Price"]) * kwh
+
+    # earliest of the cheapest starts; prefix-sum rounding must not push an
+    # equally cheap start a day later
+    best = int(np.flatnonzero(costs <= costs.min() + 1e-9)[0])
+    start_ts = earliest + pd.Timedelta(minutes=int(starts[best]))
+
+    return {
+        "start": start_ts,
+        "end": start_ts + pd.Timedelta(minutes=duration),
+        "kWh": round(kwh, 2),
+        "cost": round(float(costs[best]), 2),
+        "price_per_kWh": round(float(costs[best]) / kwh, 4),
+        "cost_if_now": round(float(costs[0]), 2) if starts[0] == 0 else None
+    }
@@ -1,13 +1,45 @@
-import boto3
-from datetime import timedelta
+import os
+import threading
+import time
 
-BUCKET = "ev-charging-app-csvs"
+from s3_utils import get_s3
 
-s3 = boto3.client("s3")
+BUCKET = os.environ.get("S3_BUCKET", "ev-charging-app-csvs")
 
-def generate_presigned_url(key, expiry_seconds=3600):
-    return s3.generate_presigned_url(
+# Presigned URLs are reused until they get close to expiry, so repeated
+# downloads of the same object cost no signing work.
+URL_EXPIRY_SECONDS = 3600
+URL_MIN_REMAINING_SECONDS = 300
+
+_url_cache = {}
+_url_lock = threading.Lock()
+
+
+def generate_presigned_url(key, expiry_seconds=URL_EXPIRY_SECONDS):
+    return get_s3().generate_presigned_url(
         ClientMethod="get_object",
         Params={"Bucket": BUCKET, "Key": key},
         ExpiresIn=expiry_seconds
     )
+
+
+def get_cached_presigned_url(key, expiry_seconds=URL_EXPIRY_SECONDS,
+                             min_remaining=URL_MIN_REMAINING_SECONDS):
+    now = time.time()
+
+    with _url_lock:
+        cached = _url_cache.get(key)
+        if cached is not None and cached[1] - now > min_remaining:
+            return cached[0]
+
+    url = generate_presigned_url(key, expiry_seconds)
+
+    with _url_lock:
+        _url_cache[key] = (url, now + expiry_seconds)
+
+    return url
+
+
+def clear_url_cache():
+    with _url_lock:
+        _url_cache.clear()
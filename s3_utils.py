@@ -1,25 +1,71 @@
-import boto3
 import os
-import pandas as pd
 import io
-from botocore.exceptions import ClientError
+import logging
+import threading
+
+# boto3 and pandas are imported on first use: both are slow to import and
+# the export service's streaming paths never need pandas.
 
 S3_BUCKET = os.environ.get("S3_BUCKET")
 AWS_REGION = os.environ.get("AWS_REGION", "eu-west-2")
 
-s3 = boto3.client("s3", region_name=AWS_REGION)
+# LOCAL_S3_DIR points the app at a directory-backed S3 stand-in (dev/tests)
+LOCAL_S3_DIR = os.environ.get("LOCAL_S3_DIR")
+
+_client = None
+_client_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+
+
+def make_s3_client():
+    if LOCAL_S3_DIR:
+        from local_s3 import LocalS3
+        return LocalS3(LOCAL_S3_DIR)
+
+    import boto3
+    return boto3.client("s3", region_name=AWS_REGION)
+
 
+def use_s3_client(client):
+    # swap in another client (e.g. local_s3.LocalS3 for load replays)
+    global _client
+    with _client_lock:
+        _client = client
+
+
+def get_s3():
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = make_s3_client()
+    return _client
+
+
+def read_csv_s3(key, columns=None, as_of=None):
+    import pandas as pd
+    from botocore.exceptions import ClientError
 
-def read_csv_s3(key, columns=None):
     try:
-        obj = s3.get_object(Bucket=S3_BUCKET, Key=key)
-        body = obj["Body"].read()
+        if as_of is not None:
+            # point-in-time read from the version history
+            from versioned_store import read_version
+            version, body = read_version(key, as_of)
+            etag = version["hash"] if version else None
+        else:
+            obj = get_s3().get_object(Bucket=S3_BUCKET, Key=key)
+            body = obj["Body"].read()
+            etag = obj.get("ETag")
 
         # arquivo vazio
-        if len(body) == 0:
+        if not body:
             return pd.DataFrame(columns=columns)
 
-        return pd.read_csv(io.BytesIO(body))
+        df = pd.read_csv(io.BytesIO(body))
+        # ETag identifies the log version for downstream caches
+        df.attrs["etag"] = etag
+        return df
 
     except ClientError as e:
         if e.response["Error"]["Code"] == "NoSuchKey":
@@ -31,12 +77,22 @@ def read_csv_s3(key, columns=None):
 
 
 def write_csv_s3(df, key):
+    from versioned_store import record_version
+
     csv_buffer = io.StringIO()
     df.to_csv(csv_buffer, index=False)
+    body = csv_buffer.getvalue().encode("utf-8")
 
-    s3.put_object(
+    get_s3().put_object(
         Bucket=S3_BUCKET,
         Key=key,
-        Body=csv_buffer.getvalue().encode("utf-8"),
+        Body=body,
         ContentType="text/csv"
     )
+
+    # immutable copy, so overwrites can be undone and read back with as_of;
+    # the table itself is already saved, so a failure here is only logged
+    try:
+        record_version(key, body)
+    except Exception:
+        logger.exception("could not record a version of %s", key)
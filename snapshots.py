@@ -0,0 +1,181 @@
+import hashlib
+import io
+import logging
+import threading
+
+import pandas as pd
+from botocore.exceptions import ClientError
+
+from s3_utils import get_s3, S3_BUCKET, read_csv_s3
+
+LOG_FILE = "charging_log.csv"
+SNAPSHOT_PREFIX = "exports/"
+SNAPSHOT_FORMATS = ("csv", "parquet")
+
+logger = logging.getLogger(__name__)
+
+_state = {
+    "log_etag": None,
+    "hashes": {},       # snapshot key -> md5 of the last body written
+}
+_state_lock = threading.Lock()
+
+
+def clear_snapshot_cache():
+    with _state_lock:
+        _state["log_etag"] = None
+        _state["hashes"] = {}
+
+
+def snapshot_key(month, fmt="csv", location=None):
+    scope = location or "all"
+    return f"{SNAPSHOT_PREFIX}{scope}/charging_log_{month}.{fmt}"
+
+
+def _serialize(df, fmt):
+    if fmt == "csv":
+        return df.to_csv(index=False).encode("utf-8")
+
+    buffer = io.BytesIO()
+    df.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def _content_type(fmt):
+    return "text/csv" if fmt == "csv" else "application/vnd.apache.parquet"
+
+
+def generate_snapshots(df=None):
+    if df is None:
+        df = read_csv_s3(LOG_FILE)
+
+    if len(df) == 0:
+        prune_snapshots(set())
+        return []
+
+    months = pd.to_datetime(df["Timestamp Start"], errors="coerce").dt.to_period("M").astype(str)
+    valid = months != "NaT"
+    df, months = df[valid], months[valid]
+
+    scopes = [(None, df)]
+    for location in sorted(df["Location"].dropna().unique()):
+        scopes.append((location, df[df["Location"] == location]))
+
+    written = []
+    produced = set()
+    for location, scoped in scopes:
+        for month, part in scoped.groupby(months.loc[scoped.index]):
+            for fmt in SNAPSHOT_FORMATS:
+                key = snapshot_key(month, fmt, location)
+                produced.add(key)
+                body = _serialize(part, fmt)
+                digest = hashlib.md5(body).hexdigest()
+
+                # unchanged months are not rewritten
+                with _state_lock:
+                    if _state["hashes"].get(key) == digest:
+                        continue
+
+                get_s3().put_object(
+                    Bucket=S3_BUCKET,
+                    Key=key,
+                    Body=body,
+                    ContentType=_content_type(fmt)
+                )
+
+                with _state_lock:
+                    _state["hashes"][key] = digest
+                written.append(key)
+
+    prune_snapshots(produced)
+    return written
+
+
+def prune_snapshots(produced):
+    # months / locations that left the log (History edit or delete) must not
+    # keep serving their old snapshot
+    stale = [key for key in list_snapshots() if key not in produced]
+
+    for key in stale:
+        get_s3().delete_object(Bucket=S3_BUCKET, Key=key)
+
+    with _state_lock:
+        for key in stale:
+            _state["hashes"].pop(key, None)
+
+    if stale:
+        logger.info("snapshots: removed %d stale objects", len(stale))
+
+    return stale
+
+
+def refresh_snapshots():
+    try:
+        etag = get_s3().head_object(Bucket=S3_BUCKET, Key=LOG_FILE)["ETag"]
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return []
+        raise
+
+    with _state_lock:
+        if etag == _state["log_etag"]:
+            return []
+
+    written = generate_snapshots()
+
+    with _state_lock:
+        _state["log_etag"] = etag
+
+    return written
+
+
+def snapshot_exists(key):
+    # asked of S3 every time: another process may have pruned the key
+    try:
+        get_s3().head_object(Bucket=S3_BUCKET, Key=key)
+    except ClientError as e:
+        if e.response["Error"]["Code"] in ("404", "NoSuchKey"):
+            return False
+        raise
+
+    return True
+
+
+def list_snapshots():
+    pages = get_s3().get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET, Prefix=SNAPSHOT_PREFIX)
+    return [obj["Key"] for page in pages for obj in page.get("Contents", [])]
+
+
+def start_snapshot_worker(interval_seconds=900, stop_event=None):
+    stop_event = stop_event or threading.Event()
+
+    def loop():
+        while not stop_event.is_set():
+            try:
+                written = refresh_snapshots()
+                if written:
+                    logger.info("snapshots: wrote %d objects", len(written))
+            except Exception:
+                logger.exception("snapshots: refresh failed")
+            stop_event.wait(interval_seconds)
+
+    worker = threading.Thread(target=loop, name="snapshot-worker", daemon=True)
+    worker.start()
+    return worker, stop_event
+
+
+# run as its own single process (not inside the web workers, which would
+# each generate and prune against their own view of the log):
+#   python snapshots.py                                   once, e.g. from cron
+#   SNAPSHOT_INTERVAL_SECONDS=900 python snapshots.py     as a long-running job
+if __name__ == "__main__":
+    import os
+
+    logging.basicConfig(level=logging.INFO)
+
+    interval = int(os.environ.get("SNAPSHOT_INTERVAL_SECONDS", 0))
+    if interval > 0:
+        start_snapshot_worker(interval)[0].join()
+    else:
+        written = refresh_snapshots()
+        logger.info("snapshots: wrote %d objects", len(written))
@@ -0,0 +1,212 @@
+import os
+import threading
+import time
+
+os.environ.setdefault("S3_BUCKET", "test-bucket")
+
+import pandas as pd
+import pytest
+
+import s3_links
+import snapshots
+import versioned_store
+from local_s3 import LocalS3
+from s3_utils import S3_BUCKET, read_csv_s3, use_s3_client, write_csv_s3
+
+
+@pytest.fixture
+def s3():
+    client = LocalS3()
+    use_s3_client(client)
+    s3_links.clear_url_cache()
+    snapshots.clear_snapshot_cache()
+    versioned_store.clear_manifest_cache()
+    yield client
+    use_s3_client(None)
+
+
+def log(rows):
+    return pd.DataFrame(rows, columns=["Timestamp Start", "Location", "kWh"])
+
+
+# ---------- Presigned URL cache ----------
+
+def test_presigned_url_reused_until_near_expiry(s3, monkeypatch):
+    now = [1_000_000.0]
+    # LocalS3 stamps Expires from the same clock
+    monkeypatch.setattr(s3_links.time, "time", lambda: now[0])
+
+    first = s3_links.get_cached_presigned_url("a.csv", expiry_seconds=3600, min_remaining=300)
+    now[0] += 3000
+    assert s3_links.get_cached_presigned_url("a.csv", expiry_seconds=3600, min_remaining=300) == first
+    assert s3.calls["generate_presigned_url"] == 1
+
+    # less than min_remaining left: signed again
+    now[0] += 301
+    renewed = s3_links.get_cached_presigned_url("a.csv", expiry_seconds=3600, min_remaining=300)
+    assert renewed != first
+    assert s3.calls["generate_presigned_url"] == 2
+
+
+# ---------- Snapshots ----------
+
+def test_unchanged_months_not_rewritten(s3):
+    df = log([
+        ["2024-01-03 21:00:00", "Home", 20.0],
+        ["2024-02-05 21:00:00", "Public", 35.0],
+    ])
+
+    first = snapshots.generate_snapshots(df)
+    assert snapshots.snapshot_key("2024-01") in first
+    assert snapshots.snapshot_key("2024-02", "parquet", "Public") in first
+
+    added = pd.concat([df, log([["2024-02-20 08:00:00", "Home", 12.0]])], ignore_index=True)
+    puts = s3.calls["put_object"]
+    second = snapshots.generate_snapshots(added)
+
+    assert sorted(second) == sorted([
+        snapshots.snapshot_key("2024-02", fmt, location)
+        for fmt in snapshots.SNAPSHOT_FORMATS
+        for location in (None, "Home")
+    ])
+    assert s3.calls["put_object"] - puts == len(second)
+
+
+def test_stale_snapshots_removed(s3):
+    df = log([
+        ["2024-01-03 21:00:00", "Home", 20.0],
+        ["2024-02-05 21:00:00", "Public", 35.0],
+    ])
+    snapshots.generate_snapshots(df)
+
+    # History edit dropped the only February / Public session
+    snapshots.generate_snapshots(df.iloc[:1])
+
+    keys = snapshots.list_snapshots()
+    assert keys == sorted(
+        snapshots.snapshot_key("2024-01", fmt, location)
+        for fmt in snapshots.SNAPSHOT_FORMATS
+        for location in (None, "Home")
+    )
+    assert not snapshots.snapshot_exists(snapshots.snapshot_key("2024-02"))
+    assert s3.head_object(Bucket=S3_BUCKET, Key=snapshots.snapshot_key("2024-01"))
+
+
+# ---------- Version history ----------
+
+def body(value):
+    return f"x\n{value}\n".encode()
+
+
+def object_keys(s3):
+    return [item["Key"] for item in s3.list_objects_v2(Bucket=S3_BUCKET, Prefix=versioned_store.OBJECT_PREFIX)["Contents"]]
+
+
+def test_as_of_picks_latest_version_at_or_before(s3):
+    for ts, value in [(100, "a"), (200, "b"), (300, "c")]:
+        versioned_store.record_version("t.csv", body(value), ts=ts)
+
+    def as_of(ts):
+        version = versioned_store.version_as_of("t.csv", ts)
+        return version and version["hash"]
+
+    assert as_of(50) is None
+    assert as_of(100) == as_of(199) == versioned_store.list_versions("t.csv")[0]["hash"]
+    assert as_of(250) == versioned_store.list_versions("t.csv")[1]["hash"]
+    assert versioned_store.read_version("t.csv", 10_000)[1] == body("c")
+
+
+def test_identical_content_stored_once(s3):
+    versioned_store.record_version("a.csv", body(1), ts=100)
+    versioned_store.record_version("b.csv", body(1), ts=100)
+    # unchanged rewrite adds no manifest entry
+    versioned_store.record_version("a.csv", body(1), ts=200)
+
+    assert len(object_keys(s3)) == 1
+    assert len(versioned_store.list_versions("a.csv")) == 1
+
+
+def test_manifest_put_is_conditional(s3):
+    versioned_store.record_version("t.csv", body("a"), ts=100)
+    stale = versioned_store.load_manifest("t.csv")["etag"]
+    versioned_store.record_version("t.csv", body("b"), ts=200)
+
+    with pytest.raises(Exception) as e:
+        versioned_store._save_manifest("t.csv", [], stale)
+    assert e.value.response["Error"]["Code"] == "PreconditionFailed"
+
+
+def test_concurrent_writers_keep_every_version(s3):
+    threads = [
+        threading.Thread(target=versioned_store.record_version, args=("t.csv", body(i)))
+        for i in range(4)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    versioned_store.clear_manifest_cache()
+    assert len(versioned_store.list_versions("t.csv")) == 4
+
+
+def test_retention_keeps_recent_and_daily(s3):
+    day = 86400
+    now = 1000 * day
+    # three saves a day for ten days, the last three days are "recent"
+    for d in range(990, 1000):
+        for h in (1, 2, 3):
+            versioned_store.record_version("t.csv", body(f"{d}-{h}"), ts=d * day + h * 3600)
+
+    kept = versioned_store.apply_retention("t.csv", keep_days=3, daily_days=8, now=now)
+
+    # last save of each day from day 992, every save from day 997 on
+    expected = [d * day + 3 * 3600 for d in range(992, 997)]
+    expected += [d * day + h * 3600 for d in range(997, 1000) for h in (1, 2, 3)]
+    assert [v["ts"] for v in kept] == expected
+
+
+def test_garbage_collection_removes_unreferenced_only(s3):
+    write_csv_s3(pd.DataFrame({"x": [1]}), "t.csv")
+    write_csv_s3(pd.DataFrame({"x": [2]}), "t.csv")
+    versioned_store.apply_retention("t.csv", keep_days=0, daily_days=0, now=time.time() + 10)
+    time.sleep(0.01)
+
+    removed = versioned_store.collect_garbage(min_age_seconds=0)
+
+    assert len(removed) == 1
+    assert read_csv_s3("t.csv", as_of=time.time())["x"].tolist() == [2]
+
+
+def test_garbage_collection_spares_content_reused_mid_run(s3, monkeypatch):
+    a, b = pd.DataFrame({"x": [1]}), pd.DataFrame({"x": [2]})
+    write_csv_s3(a, "t.csv")
+    write_csv_s3(b, "t.csv")
+    versioned_store.apply_retention("t.csv", keep_days=0, daily_days=0, now=time.time() + 10)
+    time.sleep(0.01)
+
+    # the table is edited back to A after GC has read the manifests but
+    # before it deletes A's (now unreferenced, old) object
+    head = s3.head_object
+    edited = []
+
+    def head_then_edit(**kwargs):
+        if not edited:
+            edited.append(True)
+            write_csv_s3(a, "t.csv")
+        return head(**kwargs)
+
+    monkeypatch.setattr(s3, "head_object", head_then_edit)
+    assert versioned_store.collect_garbage(min_age_seconds=0) == []
+
+    assert read_csv_s3("t.csv", as_of=time.time())["x"].tolist() == [1]
+
+
+def test_table_saved_when_version_cannot_be_recorded(s3, monkeypatch):
+    def contended(key, body, ts=None):
+        raise RuntimeError(f"manifest for {key} kept changing, version not recorded")
+
+    monkeypatch.setattr(versioned_store, "record_version", contended)
+    write_csv_s3(pd.DataFrame({"x": [1]}), "t.csv")
+
+    assert read_csv_s3("t.csv")["x"].tolist() == [1]
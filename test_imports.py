@@ -0,0 +1,63 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+# Import-time budgets: each module's cumulative import time (from
+# `python -X importtime`) must stay under its budget, and importing it must
+# not pull in a heavy module it should load lazily.
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+BUDGETS_MS = {
+    "export_service": 350,
+    "s3_utils": 50,
+    "s3_links": 50,
+    "auth_utils": 50,
+}
+
+# modules that must not be loaded just by importing these
+FORBIDDEN = {
+    "export_service": ["pandas", "numpy", "boto3", "botocore"],
+    "s3_utils": ["pandas", "boto3"],
+    "s3_links": ["pandas", "boto3"],
+    "auth_utils": ["pandas", "boto3"],
+}
+
+RUNS = 3
+
+
+def run_python(*args):
+    return subprocess.run(
+        [sys.executable, *args],
+        capture_output=True, text=True, cwd=ROOT,
+        env={**os.environ, "S3_BUCKET": os.environ.get("S3_BUCKET", "import-check")}
+    )
+
+
+def import_time_ms(module):
+    out = run_python("-X", "importtime", "-c", f"import {module}")
+
+    for line in out.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+
+    raise RuntimeError(f"could not import {module}:\n{out.stderr[-2000:]}")
+
+
+@pytest.mark.parametrize("module", sorted(BUDGETS_MS))
+def test_import_time_budget(module):
+    # best of a few runs, to keep disk cache noise out
+    ms = min(import_time_ms(module) for _ in range(RUNS))
+    assert ms <= BUDGETS_MS[module], f"{module} took {ms:.1f} ms to import"
+
+
+@pytest.mark.parametrize("module", sorted(FORBIDDEN))
+def test_no_eager_heavy_imports(module):
+    out = run_python("-c", f"import sys, {module}; print(' '.join(sys.modules))")
+    assert out.returncode == 0, out.stderr
+
+    loaded = set(out.stdout.split())
+    assert [m for m in FORBIDDEN[module] if m in loaded] == []
@@ -0,0 +1,321 @@
+import bisect
+import hashlib
+import json
+import threading
+import time
+from datetime import datetime
+
+from s3_utils import get_s3, S3_BUCKET
+
+# Every table write is also kept as an immutable, content-addressed object
+# (versions/objects/<sha256>) plus an entry in that table's manifest
+# (versions/manifests/<key>.json). Identical contents share one object, and
+# point-in-time reads are a bisect over the cached manifest.
+
+OBJECT_PREFIX = "versions/objects/"
+MANIFEST_PREFIX = "versions/manifests/"
+
+# rewritten on every start/finish, not worth keeping history for
+UNVERSIONED_KEYS = {"open_session.csv"}
+
+MANIFEST_RETRIES = 5
+
+# a cached manifest is trusted this long for reads past its newest entry;
+# after that it is revalidated with a conditional GET
+MANIFEST_TTL_SECONDS = 5
+
+_manifests = {}         # key -> {"etag": ..., "versions": [...], "ts": [...], "checked": ...}
+_lock = threading.Lock()
+
+
+def object_key(digest):
+    return f"{OBJECT_PREFIX}{digest}"
+
+
+def manifest_key(key):
+    return f"{MANIFEST_PREFIX}{key}.json"
+
+
+def to_epoch(as_of):
+    if isinstance(as_of, (int, float)):
+        return float(as_of)
+    if isinstance(as_of, str):
+        try:
+            return float(as_of)
+        except ValueError:
+            as_of = datetime.fromisoformat(as_of)
+    return as_of.timestamp()
+
+
+def _not_found(e):
+    return e.response["Error"]["Code"] in ("404", "NoSuchKey")
+
+
+def _not_modified(e):
+    return e.response["Error"]["Code"] in ("304", "NotModified")
+
+
+def _precondition_failed(e):
+    return e.response["Error"]["Code"] in ("PreconditionFailed", "ConditionalRequestConflict", "412", "409")
+
+
+# ---------- Manifests ----------
+
+def _cached(etag, versions):
+    return {"etag": etag, "versions": versions, "ts": [v["ts"] for v in versions], "checked": time.monotonic()}
+
+
+def load_manifest(key):
+    from botocore.exceptions import ClientError
+
+    with _lock:
+        cached = _manifests.get(key)
+
+    # unchanged manifests come back as a bodiless 304
+    conditions = {"IfNoneMatch": cached["etag"]} if cached and cached["etag"] else {}
+
+    try:
+        obj = get_s3().get_object(Bucket=S3_BUCKET, Key=manifest_key(key), **conditions)
+    except ClientError as e:
+        if _not_modified(e):
+            with _lock:
+                cached["checked"] = time.monotonic()
+            return cached
+        if not _not_found(e):
+            raise
+        manifest = _cached(None, [])
+    else:
+        manifest = _cached(obj["ETag"], json.loads(obj["Body"].read())["versions"])
+
+    with _lock:
+        _manifests[key] = manifest
+
+    return manifest
+
+
+def _save_manifest(key, versions, etag):
+    # conditional put: a concurrent writer makes this fail instead of
+    # silently dropping its version
+    conditions = {"IfMatch": etag} if etag else {"IfNoneMatch": "*"}
+
+    resp = get_s3().put_object(
+        Bucket=S3_BUCKET,
+        Key=manifest_key(key),
+        Body=json.dumps({"key": key, "versions": versions}).encode("utf-8"),
+        ContentType="application/json",
+        **conditions
+    )
+
+    with _lock:
+        _manifests[key] = _cached(resp["ETag"], versions)
+
+
+def _update_manifest(key, change):
+    from botocore.exceptions import ClientError
+
+    for _ in range(MANIFEST_RETRIES):
+        manifest = load_manifest(key)
+        versions = change(list(manifest["versions"]))
+        if versions is None:
+            return manifest["versions"]
+
+        try:
+            _save_manifest(key, versions, manifest["etag"])
+            return versions
+        except ClientError as e:
+            if not _precondition_failed(e):
+                raise
+
+    raise RuntimeError(f"manifest for {key} kept changing, version not recorded")
+
+
+def clear_manifest_cache():
+    with _lock:
+        _manifests.clear()
+
+
+def list_versions(key):
+    return load_manifest(key)["versions"]
+
+
+# ---------- Writes ----------
+
+def _store_object(digest, body):
+    from botocore.exceptions import ClientError
+
+    key = object_key(digest)
+
+    # an existing object is copied onto itself so its LastModified moves
+    # forward: garbage collection (another process) only deletes objects
+    # older than its grace period, and this one is about to be referenced
+    try:
+        get_s3().copy_object(
+            Bucket=S3_BUCKET,
+            Key=key,
+            CopySource={"Bucket": S3_BUCKET, "Key": key},
+            MetadataDirective="REPLACE"
+        )
+    except ClientError as e:
+        if not _not_found(e):
+            raise
+        get_s3().put_object(Bucket=S3_BUCKET, Key=key, Body=body)
+
+
+def record_version(key, body, ts=None):
+    if key in UNVERSIONED_KEYS:
+        return None
+
+    digest = hashlib.sha256(body).hexdigest()
+    _store_object(digest, body)
+
+    ts = ts if ts is not None else time.time()
+
+    def append(versions):
+        # unchanged table, nothing new to record
+        if versions and versions[-1]["hash"] == digest:
+            return None
+        # keep the manifest sorted even if writers' clocks disagree
+        latest = versions[-1]["ts"] if versions else ts
+        return versions + [{"ts": max(ts, latest), "hash": digest, "size": len(body)}]
+
+    _update_manifest(key, append)
+    return digest
+
+
+# ---------- Point-in-time reads ----------
+
+def version_as_of(key, as_of):
+    ts = to_epoch(as_of)
+
+    with _lock:
+        manifest = _manifests.get(key)
+
+    # a cached manifest answers without any S3 call when it already covers
+    # `ts`, or when it was revalidated within the TTL
+    covered = manifest is not None and manifest["ts"] and manifest["ts"][-1] >= ts
+    fresh = manifest is not None and time.monotonic() - manifest["checked"] <= MANIFEST_TTL_SECONDS
+    if not (covered or fresh):
+        manifest = load_manifest(key)
+
+    i = bisect.bisect_right(manifest["ts"], ts)
+    return manifest["versions"][i - 1] if i > 0 else None
+
+
+def read_object(key, version):
+    from botocore.exceptions import ClientError
+
+    try:
+        obj = get_s3().get_object(Bucket=S3_BUCKET, Key=object_key(version["hash"]))
+    except ClientError as e:
+        if _not_found(e):
+            # never fall back to "empty table" for a version the manifest lists
+            raise RuntimeError(f"content of {key} version {version['hash']} is missing from the store") from e
+        raise
+
+    return obj["Body"].read()
+
+
+def read_version(key, as_of):
+    version = version_as_of(key, as_of)
+    if version is None:
+        return None, None
+
+    try:
+        return version, read_object(key, version)
+    except RuntimeError:
+        # retention elsewhere may have dropped it; ask the current manifest once
+        load_manifest(key)
+        version = version_as_of(key, as_of)
+        if version is None:
+            return None, None
+        return version, read_object(key, version)
+
+
+def restore_version(key, version):
+    body = read_object(key, version)
+    get_s3().put_object(Bucket=S3_BUCKET, Key=key, Body=body, ContentType="text/csv")
+    record_version(key, body)
+
+
+# ---------- Retention ----------
+
+def apply_retention(key, keep_days=30, daily_days=365, now=None):
+    # all versions from the last `keep_days`, then the last version of each
+    # day up to `daily_days`; the latest version is always kept
+    now = now if now is not None else time.time()
+    recent_cutoff = now - keep_days * 86400
+    daily_cutoff = now - daily_days * 86400
+
+    def thin(versions):
+        kept = []
+        last_day = None
+        for v in reversed(versions):
+            day = int(v["ts"] // 86400)
+            if not kept or v["ts"] >= recent_cutoff:
+                kept.append(v)
+            elif v["ts"] >= daily_cutoff and day != last_day:
+                kept.append(v)
+            last_day = day
+        kept.reverse()
+        return kept if len(kept) != len(versions) else None
+
+    return _update_manifest(key, thin)
+
+
+def _list_keys(prefix):
+    pages = get_s3().get_paginator("list_objects_v2").paginate(Bucket=S3_BUCKET, Prefix=prefix)
+    for page in pages:
+        yield from page.get("Contents", [])
+
+
+def collect_garbage(min_age_seconds=86400):
+    # delete content objects no manifest refers to any more; recent objects
+    # are left alone in case their manifest entry is still being written
+    s3 = get_s3()
+    cutoff = time.time() - min_age_seconds
+
+    # objects first, manifests second: an entry added in between is then
+    # either seen in its manifest or has refreshed its object's age
+    old = [
+        item["Key"] for item in _list_keys(OBJECT_PREFIX)
+        if item["LastModified"].timestamp() < cutoff
+    ]
+
+    referenced = set()
+    for item in _list_keys(MANIFEST_PREFIX):
+        body = s3.get_object(Bucket=S3_BUCKET, Key=item["Key"])["Body"].read()
+        referenced.update(v["hash"] for v in json.loads(body)["versions"])
+
+    removed = []
+    for key in old:
+        digest = key[len(OBJECT_PREFIX):]
+        if digest in referenced:
+            continue
+        # re-check the age right before deleting, a writer may have just
+        # reused this content
+        if s3.head_object(Bucket=S3_BUCKET, Key=key)["LastModified"].timestamp() >= cutoff:
+            continue
+        s3.delete_object(Bucket=S3_BUCKET, Key=key)
+        removed.append(digest)
+
+    return removed
+
+
+def compact_all(keep_days=30, daily_days=365):
+    prefix_len = len(MANIFEST_PREFIX)
+
+    for item in list(_list_keys(MANIFEST_PREFIX)):
+        apply_retention(item["Key"][prefix_len:-len(".json")], keep_days, daily_days)
+
+    return collect_garbage()
+
+
+# run periodically (cron / scheduled job): python versioned_store.py
+if __name__ == "__main__":
+    import os
+
+    removed = compact_all(
+        keep_days=int(os.environ.get("VERSION_KEEP_DAYS", 30)),
+        daily_days=int(os.environ.get("VERSION_DAILY_DAYS", 365))
+    )
+    print(f"versions: removed {len(removed)} unreferenced objects")